@@ -1,15 +1,33 @@
 # scraper-seace/main.py
 
 import asyncio
+import csv
+import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import sys
 from datetime import datetime
+from playwright.async_api import async_playwright
 from scrapers.seace_logic import (
     scrape_seace_playwright,
     extraer_cubso_batch,
-    determinar_sector
+    BROWSER_ARGS,
+    CONTEXT_OPTS,
+    _SECTOR_PATTERNS
 )
 
+# Perfil persistente de Chromium: conserva el cache HTTP (chunks de Angular,
+# fuentes, css) entre corridas. Borrar solo ante cambios mayores del SEACE.
+USER_DATA_DIR = ".pw-cache"
+
+# Columnas del CSV de salida (mismo orden que los dicts del scraper)
+CSV_FIELDS = [
+    "Codigo Proceso", "Entidad", "Descripcion", "Estado",
+    "Fecha Publicacion", "Fechas Cotizacion", "Enlace Detalle",
+    "CUBSO", "Segmento"
+]
+
 
 def validar_fecha(fecha_str: str) -> bool:
     """Valida si una cadena tiene formato dd/mm/yyyy"""
@@ -20,6 +38,60 @@ def validar_fecha(fecha_str: str) -> bool:
         return False
 
 
+async def run_pipeline(fecha_inicio: str, fecha_fin: str, max_paginas: int, page_size: int, raw_file: str):
+    """
+    Ejecuta scraping + extracción de CUBSO sobre un contexto persistente
+    (el cache HTTP de Chromium sobrevive entre corridas en USER_DATA_DIR).
+
+    Cada licitación se escribe a raw_file apenas se parsea (memoria O(página)
+    en vez de O(total de filas)); solo los enlaces quedan en memoria para la
+    fase de CUBSO. Devuelve (total de filas, dict url → CUBSO).
+    """
+    total = 0
+    enlaces = []
+
+    async with async_playwright() as p:
+        context = await p.chromium.launch_persistent_context(
+            USER_DATA_DIR,
+            headless=True,
+            args=BROWSER_ARGS,
+            **CONTEXT_OPTS
+        )
+        try:
+            # 🚀 Ejecutar scraper principal, volcando cada fila al CSV crudo
+            print("🔍 Iniciando scraping de licitaciones...")
+            print(f"⚙️  Configuración: {page_size} resultados/página, {max_paginas} páginas máx.")
+            with open(raw_file, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+                async for lic in scrape_seace_playwright(
+                    context,
+                    fecha_inicio=fecha_inicio,
+                    fecha_fin=fecha_fin,
+                    max_paginas=max_paginas,
+                    page_size=page_size
+                ):
+                    writer.writerow(lic)
+                    total += 1
+                    if lic["Enlace Detalle"]:
+                        enlaces.append(lic["Enlace Detalle"])
+
+            if not total:
+                return 0, {}
+
+            # 🔄 Extraer CUBSO de los enlaces (deduplicados: cada URL se visita una vez
+            # y el merge posterior por URL reutiliza el resultado)
+            unique_enlaces = list(dict.fromkeys(enlaces))
+            print(f"\n🔗 Extrayendo CUBSO de {len(unique_enlaces)} enlaces únicos ({len(enlaces)} en total)...")
+            cubso_dict = {}
+            # Consumir resultados conforme llegan (sin esperar al más lento)
+            async for url, cubso in extraer_cubso_batch(context, unique_enlaces, max_concurrent=10):  # Aumentado de 5 a 10
+                cubso_dict[url] = cubso
+            return total, cubso_dict
+        finally:
+            await context.close()
+
+
 async def main():
     # 🔧 Configuración por defecto
     FECHA_INICIO_DEFECTO = "27/10/2025"
@@ -41,38 +113,47 @@ async def main():
         FECHA_FIN = FECHA_FIN_DEFECTO
         print(f"📅 Usando rango por defecto: {FECHA_INICIO} → {FECHA_FIN}")
 
-    # 🚀 Ejecutar scraper principal
-    print("🔍 Iniciando scraping de licitaciones...")
-    print(f"⚙️  Configuración: {PAGE_SIZE} resultados/página, {MAX_PAGINAS} páginas máx.")
-    licitaciones = await scrape_seace_playwright(
-        fecha_inicio=FECHA_INICIO,
-        fecha_fin=FECHA_FIN,
-        max_paginas=MAX_PAGINAS,
-        page_size=PAGE_SIZE
-    )
-
-    if not licitaciones:
-        print("⚠️ No se encontraron licitaciones en el rango especificado.")
-        return
-
-    # 🔄 Extraer CUBSO de los enlaces
-    enlaces = [lic["Enlace Detalle"] for lic in licitaciones if lic["Enlace Detalle"]]
-    print(f"\n🔗 Extrayendo CUBSO de {len(enlaces)} enlaces...")
-    cubso_dict = await extraer_cubso_batch(enlaces, max_concurrent=10)  # Aumentado de 5 a 10
-
-    # 🧩 Combinar CUBSO y determinar sector
-    for lic in licitaciones:
-        url = lic["Enlace Detalle"]
-        lic["CUBSO"] = cubso_dict.get(url, "No disponible")
-        lic["Segmento"] = determinar_sector(lic["Descripcion"])
-
-    # 📊 Convertir a DataFrame y guardar
-    df = pd.DataFrame(licitaciones)
     output_file = f"licitaciones_seace_{FECHA_INICIO.replace('/', '')}-{FECHA_FIN.replace('/', '')}.csv"
-    df.to_csv(output_file, index=False, encoding="utf-8-sig")
-    print(f"\n✅ Resultados guardados en: {output_file}")
-    print(f"📊 Total de licitaciones procesadas: {len(df)}")
+    raw_file = output_file + ".tmp"
+
+    try:
+        total, cubso_dict = await run_pipeline(FECHA_INICIO, FECHA_FIN, MAX_PAGINAS, PAGE_SIZE, raw_file)
+
+        if not total:
+            print("⚠️ No se encontraron licitaciones en el rango especificado.")
+            return
+
+        # 📊 Segunda pasada: parchear CUBSO y clasificar sector vectorizado
+        df = pd.read_csv(raw_file, dtype=str, keep_default_na=False)
+        df["CUBSO"] = df["Enlace Detalle"].map(cubso_dict).fillna("No disponible")
+
+        desc = df["Descripcion"].fillna("").str.lower()
+        df["Segmento"] = "OTROS"
+        for label, pat in _SECTOR_PATTERNS:   # de más específico a más general
+            mask = (df["Segmento"] == "OTROS") & desc.str.contains(pat.pattern, regex=True, na=False)
+            df.loc[mask, "Segmento"] = label
+
+        # Dtypes compactos: vocabularios cortos como categoría (Estado tiene
+        # unos pocos valores repetidos en miles de filas) y la fecha de
+        # publicación como datetime real para filtros vectorizados posteriores
+        for col in ("Estado", "Segmento", "CUBSO"):
+            df[col] = df[col].astype("category")
+        df["Fecha Publicacion"] = pd.to_datetime(
+            df["Fecha Publicacion"].str.split().str[0], format="%d/%m/%Y", errors="coerce"
+        )
+
+        # Escritura con el writer C++ de Arrow (el to_csv de pandas itera celda
+        # a celda en Python); BOM manual para mantener compatibilidad con Excel
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with open(output_file, "wb") as f:
+            f.write(b"\xef\xbb\xbf")
+            pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(include_header=True))
+        print(f"\n✅ Resultados guardados en: {output_file}")
+        print(f"📊 Total de licitaciones procesadas: {len(df)}")
+    finally:
+        if os.path.exists(raw_file):
+            os.remove(raw_file)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
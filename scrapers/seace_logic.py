@@ -1,13 +1,13 @@
 # scraper-seace/scrapers/seace_logic.py
 
 import asyncio
+import functools
 import re
 from datetime import datetime
 from urllib.parse import urljoin
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 import pandas as pd
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+from playwright.async_api import BrowserContext
 
 
 # ==============================
@@ -16,11 +16,29 @@ from playwright.async_api import async_playwright
 
 SEACE_URL = "https://prod6.seace.gob.pe/buscador-publico/contrataciones"
 
+# Argumentos de lanzamiento de Chromium (un solo lugar para todo el pipeline)
+BROWSER_ARGS = [
+    "--no-sandbox", "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage", "--disable-gpu",
+    "--disable-software-rasterizer"
+]
+
+# Opciones compartidas para crear BrowserContext
+CONTEXT_OPTS = {
+    "viewport": {"width": 1920, "height": 1080},
+    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+# Prefijos para clasificar los <p> de cada tarjeta (hot loop del parseo)
+DESC_PREFIXES = ("Servicio:", "Bien:", "Obra:", "Consultoría:", "Consultoria:")
+ENTIDAD_EXCLUDE = ("servicio:", "bien:", "obra:", "fecha")
+
 
 # ==============================
 # FUNCIONES DE PARSEO DE FECHA
 # ==============================
 
+@functools.lru_cache(maxsize=4096)
 def parse_fecha_seace(fecha_str: str) -> Optional[datetime]:
     """
     Parsea fecha del formato SEACE: 'dd/mm/yyyy HH:MM:SS' o 'dd/mm/yyyy'
@@ -56,16 +74,50 @@ def fecha_en_rango(fecha_str: str, fecha_inicio: str, fecha_fin: str) -> bool:
 # EXTRACCIÓN PRINCIPAL
 # ==============================
 
+# Extractor de tarjetas ejecutado dentro del navegador: un solo viaje
+# cross-process por página con los campos ya estructurados, en vez de
+# serializar todo el HTML a Python y reparsearlo
+_JS_EXTRAER_CARDS = """() => {
+    const selectores = [
+        "div.bg-fondo-section", "div[class*='bg-fondo']",
+        "div.rounded-md", "app-card-contratacion", "div[class*='card']",
+    ];
+    let cards = [];
+    let selector = "";
+    for (const s of selectores) {
+        cards = document.querySelectorAll(s);
+        if (cards.length > 0) { selector = s; break; }
+    }
+    return {
+        selector,
+        cards: [...cards].map(c => ({
+            font_semibolds: [...c.querySelectorAll("p.font-semibold")].map(p => p.innerText.trim()),
+            estado: c.querySelector("span[class*='bg-']")?.innerText?.trim() ?? "",
+            ps: [...c.querySelectorAll("p")].map(p => p.innerText.trim()),
+            href: c.querySelector(
+                "a[href*='/buscador-publico/contrataciones/'], a[href*='/contrataciones/']"
+            )?.getAttribute("href") ?? ""
+        }))
+    };
+}"""
+
+
 async def scrape_seace_playwright(
+    context: BrowserContext,
     fecha_inicio: str,
     fecha_fin: str,
     max_paginas: int,
     page_size: int
-) -> List[Dict]:
+) -> AsyncIterator[Dict]:
     """
-    Scraper del SEACE que extrae licitaciones y filtra por fecha de publicación
+    Scraper del SEACE que extrae licitaciones y filtra por fecha de publicación.
+
+    Generador asíncrono: produce cada licitación en rango apenas se parsea su
+    tarjeta, para que el llamador pueda escribirla a disco sin acumular todo
+    el resultado en memoria.
 
     Args:
+        context: BrowserContext persistente compartido (ver run_pipeline en main.py)
         fecha_inicio: Fecha inicial en formato dd/mm/yyyy
         fecha_fin: Fecha final en formato dd/mm/yyyy
         max_paginas: Número de páginas a scrapear
@@ -76,283 +128,305 @@ async def scrape_seace_playwright(
     print(f"   → Estrategia: Extraer licitaciones recientes y filtrar localmente")
     print(f"⚙️  Configuración: {page_size} resultados/página, revisando {max_paginas} páginas.\n")
 
-    todas_licitaciones = []
-    licitaciones_en_rango = []
+    total_extraidas = 0
+    total_en_rango = 0
     page_count = 1
     current_page_size_text = "5"
 
+    # Límites del rango parseados una sola vez (no por tarjeta)
+    _inicio = parse_fecha_seace(fecha_inicio)
+    _fin = parse_fecha_seace(fecha_fin)
+
+    page = await context.new_page()
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    "--no-sandbox", "--disable-setuid-sandbox",
-                    "--disable-dev-shm-usage", "--disable-gpu",
-                    "--disable-software-rasterizer"
-                ]
-            )
-            context = await browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
-            page = await context.new_page()
 
-            # 1. Cargar página
-            print("   ⏳ Cargando SEACE...")
-            await page.goto(SEACE_URL, wait_until="networkidle", timeout=60000)
-            print("   ✅ Página cargada")
+        # 1. Cargar página: DOMContentLoaded llega mucho antes que networkidle
+        # en una SPA Angular con XHR/long-poll abiertos; lo que importa es que
+        # aparezca el primer elemento real de resultados
+        print("   ⏳ Cargando SEACE...")
+        await page.goto(SEACE_URL, wait_until="domcontentloaded", timeout=30000)
+        print("   ✅ Página cargada")
 
-            # 2. Esperar que Angular cargue
-            print("   ⏳ Esperando aplicación Angular...")
-            await page.wait_for_timeout(5000)
+        # 2. Esperar que Angular cargue (anclado al paginador, no a un sleep fijo)
+        print("   ⏳ Esperando aplicación Angular...")
+        try:
+            await page.wait_for_selector(
+                "mat-select[aria-labelledby*='mat-paginator-page-size-label'], div[class*='rounded']",
+                timeout=30000
+            )
+        except Exception:
+            pass
 
-            # Configurar tamaño de página
+        # Configurar tamaño de página
+        try:
+            await page.wait_for_selector("span.mat-mdc-select-min-line", timeout=10000)
+            current_size_elem = page.locator("span.mat-mdc-select-min-line").first
+            current_page_size_text = await current_size_elem.inner_text()
+
+            if int(current_page_size_text) == page_size:
+                print(f"   ℹ️  El tamaño de página ya está configurado en {page_size}. Omitiendo clic.")
+            else:
+                print(f"   ⚙️  Cambiando tamaño de página de {current_page_size_text} a {page_size}...")
+                prev_count = await page.locator("div[class*='bg-fondo']").count()
+                await page.locator("mat-select[aria-labelledby*='mat-paginator-page-size-label']").click()
+                await page.wait_for_selector("mat-option[role='option']", timeout=5000)
+                await page.locator(f"mat-option[role='option']:has-text('{page_size}')").click()
+                print("   ⏳ Esperando recarga de resultados...")
+                await page.wait_for_function(
+                    "(prev) => document.querySelectorAll(\"div[class*='bg-fondo']\").length !== prev",
+                    arg=prev_count, timeout=15000
+                )
+                print("   ✅ Tamaño de página configurado")
+
+        except Exception as e:
+            print(f"   ⚠️ No se pudo configurar el tamaño de página. Continuando con {current_page_size_text} resultados/pág.")
+            print(f"      Error: {str(e).splitlines()[0]}")
+
+        # Verificar resultados iniciales
+        print("   ⏳ Esperando resultados iniciales...")
+        resultados_cargados = False
+        for intento in range(5):
             try:
-                await page.wait_for_selector("span.mat-mdc-select-min-line", timeout=10000)
-                current_size_elem = page.locator("span.mat-mdc-select-min-line").first
-                current_page_size_text = await current_size_elem.inner_text()
+                await page.wait_for_selector("div[class*='rounded']", timeout=10000)
+                resultados_cargados = True
+                print("   ✅ Resultados detectados")
+                break
+            except:
+                print(f"   ⏳ Intento {intento + 1}/5...")
+
+        if not resultados_cargados:
+            print("   ⚠️ No se detectaron resultados. Guardando HTML...")
+            content = await page.content()
+            with open('debug_initial_load.html', 'w', encoding='utf-8') as f:
+                f.write(content)
+            print("   🐛 Revise 'debug_initial_load.html'")
+            try:
+                print("   🔄 Intentando buscar con filtros vacíos...")
+                buttons = await page.query_selector_all("button")
+                for btn in buttons:
+                    text = await btn.inner_text()
+                    if 'Buscar' in text or 'buscar' in text.lower():
+                        await btn.click()
+                        await page.wait_for_selector("div[class*='rounded']", timeout=10000)
+                        break
+            except:
+                pass
+
+        # Extracción con paginación
+        #
+        # NOTA sobre paralelizar la paginación: el buscador es una SPA Angular
+        # cuyo paginador (mat-paginator) no refleja la página en la URL — no
+        # existe un deep-link tipo ?page=N que permita repartir offsets entre
+        # varios BrowserContexts. Mientras el SEACE no exponga la página en la
+        # ruta, la paginación tiene que ser secuencial sobre una misma página.
+        while page_count <= max_paginas:
+            print(f"\n   📄 === PÁGINA {page_count} / {max_paginas} ===")
+            page_max_fecha = None   # fecha más reciente vista en esta página
+
+            # Las tarjetas renderizan eagerly al cambiar el paginador; esperar
+            # a que existan y reservar el scroll solo como respaldo si no
+            # aparecen (antes: 2.5s de scroll ciego por página)
+            try:
+                await page.wait_for_function(
+                    "() => document.querySelectorAll(\"div[class*='bg-fondo']\").length > 0",
+                    timeout=15000
+                )
+            except Exception:
+                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                await page.wait_for_timeout(1500)
+                await page.evaluate("window.scrollTo(0, 0)")
+                await page.wait_for_timeout(1000)
 
-                if int(current_page_size_text) == page_size:
-                    print(f"   ℹ️  El tamaño de página ya está configurado en {page_size}. Omitiendo clic.")
+            extraccion = await page.evaluate(_JS_EXTRAER_CARDS)
+            cards = extraccion["cards"]
+            if cards:
+                print(f"      ✅ Selector '{extraccion['selector']}' → {len(cards)} tarjetas")
+
+            if not cards:
+                print(f"      ⚠️ No se encontraron tarjetas")
+                with open(f'debug_page_{page_count}.html', 'w', encoding='utf-8') as f:
+                    f.write(await page.content())
+                print(f"      🐛 HTML guardado: debug_page_{page_count}.html")
+                if page_count == 1:
+                    print("\n   ❌ No se detectó estructura de licitaciones en la primera página")
+                    break
                 else:
-                    print(f"   ⚙️  Cambiando tamaño de página de {current_page_size_text} a {page_size}...")
-                    await page.locator("mat-select[aria-labelledby*='mat-paginator-page-size-label']").click()
-                    await page.wait_for_timeout(500)
-                    await page.locator(f"mat-option[role='option']:has-text('{page_size}')").click()
-                    print("   ⏳ Esperando recarga de resultados...")
-                    await page.wait_for_load_state("networkidle", timeout=10000)
-                    await page.wait_for_timeout(2000)
-                    print("   ✅ Tamaño de página configurado")
-
-            except Exception as e:
-                print(f"   ⚠️ No se pudo configurar el tamaño de página. Continuando con {current_page_size_text} resultados/pág.")
-                print(f"      Error: {str(e).splitlines()[0]}")
-
-            await page.wait_for_timeout(3000)
-
-            # Verificar resultados iniciales
-            print("   ⏳ Esperando resultados iniciales...")
-            resultados_cargados = False
-            for intento in range(5):
-                try:
-                    await page.wait_for_selector("div[class*='rounded']", timeout=10000)
-                    resultados_cargados = True
-                    print("   ✅ Resultados detectados")
+                    print("   📋 Fin de resultados")
                     break
-                except:
-                    print(f"   ⏳ Intento {intento + 1}/5...")
-                    await page.wait_for_timeout(3000)
-
-            if not resultados_cargados:
-                print("   ⚠️ No se detectaron resultados. Guardando HTML...")
-                content = await page.content()
-                with open('debug_initial_load.html', 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print("   🐛 Revise 'debug_initial_load.html'")
+
+            for idx, card in enumerate(cards, 1):
                 try:
-                    print("   🔄 Intentando buscar con filtros vacíos...")
-                    buttons = await page.query_selector_all("button")
-                    for btn in buttons:
-                        text = await btn.inner_text()
-                        if 'Buscar' in text or 'buscar' in text.lower():
-                            await btn.click()
-                            await page.wait_for_timeout(5000)
-                            break
-                except:
-                    pass
+                    # Un solo recorrido de los <p> de la tarjeta, clasificando
+                    # cada párrafo por prefijo (antes: 4 pasadas separadas)
+                    font_semibolds = card["font_semibolds"]
 
-            # Extracción con paginación
-            while page_count <= max_paginas:
-                print(f"\n   📄 === PÁGINA {page_count} / {max_paginas} ===")
+                    codigo_proceso = "No disponible"
+                    if font_semibolds:
+                        codigo_proceso = font_semibolds[0]
 
-                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                await page.wait_for_timeout(1500)
-                await page.evaluate("window.scrollTo(0, 0)")
-                await page.wait_for_timeout(1000)
+                    estado = card["estado"] or "No disponible"
 
-                content = await page.content()
-                soup = BeautifulSoup(content, 'html.parser')
+                    entidad = "No disponible"
+                    if len(font_semibolds) > 1:
+                        entidad = font_semibolds[1]
 
-                cards = []
-                selectores_posibles = [
-                    "div.bg-fondo-section", "div[class*='bg-fondo']",
-                    "div.rounded-md", "app-card-contratacion", "div[class*='card']",
-                ]
-                for selector in selectores_posibles:
-                    cards = soup.select(selector)
-                    if len(cards) > 0:
-                        print(f"      ✅ Selector '{selector}' → {len(cards)} tarjetas")
-                        break
+                    descripcion = "No disponible"
+                    fecha_pub = "No disponible"
+                    fechas_cot = "No disponible"
 
-                if not cards:
-                    print(f"      ⚠️ No se encontraron tarjetas")
-                    with open(f'debug_page_{page_count}.html', 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    print(f"      🐛 HTML guardado: debug_page_{page_count}.html")
-                    if page_count == 1:
-                        print("\n   ❌ No se detectó estructura de licitaciones en la primera página")
-                        break
-                    else:
-                        print("   📋 Fin de resultados")
-                        break
+                    for txt in card["ps"]:
+                        lt = txt.lower()
 
-                for idx, card in enumerate(cards, 1):
-                    try:
-                        card_text = card.get_text(separator="\n", strip=True)
-                        codigo_proceso = "No disponible"
-                        codigo_elem = card.select_one("p.font-semibold")
-                        if codigo_elem:
-                            codigo_proceso = codigo_elem.get_text(strip=True)
-
-                        estado = "No disponible"
-                        estado_elem = card.select_one("span[class*='bg-']")
-                        if estado_elem:
-                            estado = estado_elem.get_text(strip=True)
-
-                        entidad = "No disponible"
-                        font_semibolds = card.select("p.font-semibold")
-                        if len(font_semibolds) > 1:
-                            entidad = font_semibolds[1].get_text(strip=True)
-                        elif len(font_semibolds) == 1:
-                            all_ps = card.select("p")
-                            for p in all_ps:
-                                txt = p.get_text(strip=True)
-                                if len(txt) > 20 and txt != codigo_proceso and not any(
-                                    x in txt.lower() for x in ['servicio:', 'bien:', 'obra:', 'fecha']
-                                ):
-                                    entidad = txt
+                        if descripcion == "No disponible" and txt.startswith(DESC_PREFIXES):
+                            for prefix in DESC_PREFIXES:
+                                if txt.startswith(prefix):
+                                    descripcion = txt[len(prefix):].strip()
                                     break
+                        elif fecha_pub == "No disponible" and "Fecha de publicación:" in txt:
+                            fecha_pub = txt.replace("Fecha de publicación:", "").strip()
+                        elif fechas_cot == "No disponible" and ("Cotizaciones:" in txt or "Cotización:" in txt):
+                            fechas_cot = txt.replace("Cotizaciones:", "").replace("Cotización:", "").strip()
+                        elif (entidad == "No disponible" and len(font_semibolds) == 1
+                              and len(txt) > 20 and txt != codigo_proceso
+                              and not any(x in lt for x in ENTIDAD_EXCLUDE)):
+                            entidad = txt
+
+                    enlace = ""
+                    if card["href"]:
+                        enlace = urljoin(SEACE_URL, card["href"])
+
+                    licitacion = {
+                        "Codigo Proceso": codigo_proceso,
+                        "Entidad": entidad,
+                        "Descripcion": descripcion,
+                        "Estado": estado,
+                        "Fecha Publicacion": fecha_pub,
+                        "Fechas Cotizacion": fechas_cot,
+                        "Enlace Detalle": enlace,
+                        "CUBSO": "",
+                        "Segmento": ""
+                    }
+
+                    total_extraidas += 1
+
+                    fecha_dt = parse_fecha_seace(fecha_pub) if fecha_pub != "No disponible" else None
+                    if fecha_dt:
+                        if page_max_fecha is None or fecha_dt > page_max_fecha:
+                            page_max_fecha = fecha_dt
+                        if _inicio <= fecha_dt <= _fin:
+                            total_en_rango += 1
+                            yield licitacion
 
-                        descripcion = "No disponible"
-                        for p in card.select("p"):
-                            txt = p.get_text(strip=True)
-                            if any(prefix in txt for prefix in ["Servicio:", "Bien:", "Obra:", "Consultoría:", "Consultoria:"]):
-                                descripcion = txt
-                                for prefix in ["Servicio:", "Bien:", "Obra:", "Consultoría:", "Consultoria:"]:
-                                    descripcion = descripcion.replace(prefix, "").strip()
-                                break
-
-                        fecha_pub = "No disponible"
-                        for p in card.select("p"):
-                            txt = p.get_text(strip=True)
-                            if "Fecha de publicación:" in txt:
-                                fecha_pub = txt.replace("Fecha de publicación:", "").strip()
-                                break
-
-                        fechas_cot = "No disponible"
-                        for p in card.select("p"):
-                            txt = p.get_text(strip=True)
-                            if "Cotizaciones:" in txt or "Cotización:" in txt:
-                                fechas_cot = txt.replace("Cotizaciones:", "").replace("Cotización:", "").strip()
-                                break
-
-                        enlace = ""
-                        enlace_elem = card.select_one("a[href*='/buscador-publico/contrataciones/']")
-                        if not enlace_elem:
-                            enlace_elem = card.select_one("a[href*='/contrataciones/']")
-                        if enlace_elem and enlace_elem.get('href'):
-                            enlace = urljoin(SEACE_URL, enlace_elem['href'])
-
-                        licitacion = {
-                            "Codigo Proceso": codigo_proceso,
-                            "Entidad": entidad,
-                            "Descripcion": descripcion,
-                            "Estado": estado,
-                            "Fecha Publicacion": fecha_pub,
-                            "Fechas Cotizacion": fechas_cot,
-                            "Enlace Detalle": enlace,
-                            "CUBSO": "",
-                            "Segmento": ""
-                        }
+                except Exception as e:
+                    print(f"      ❌ Error en tarjeta {idx}: {e}")
+                    continue
+
+            print(f"      ✅ Extraídas: {len(cards)} | Total: {total_extraidas} | En rango: {total_en_rango}")
 
-                        todas_licitaciones.append(licitacion)
+            # Corte temprano: los resultados vienen ~reverso-cronológicos; si
+            # hasta la tarjeta más reciente de la página es anterior al inicio
+            # del rango, las páginas siguientes solo pueden ser más antiguas
+            if page_max_fecha and page_max_fecha < _inicio:
+                print(f"   📋 Página completa anterior a {fecha_inicio}; cortando paginación")
+                break
 
-                        if fecha_pub != "No disponible":
-                            if fecha_en_rango(fecha_pub, fecha_inicio, fecha_fin):
-                                licitaciones_en_rango.append(licitacion)
+            # Paginación
+            if page_count >= max_paginas:
+                print(f"   📋 Límite de páginas ({max_paginas}) alcanzado")
+                break
 
-                    except Exception as e:
-                        print(f"      ❌ Error en tarjeta {idx}: {e}")
+            try:
+                next_btn = None
+                next_selectors = [
+                    "button[aria-label='Siguiente página']",
+                    "button[aria-label*='Next']",
+                    "button:has-text('›')",
+                    "button:has-text('Siguiente')"
+                ]
+                for selector in next_selectors:
+                    try:
+                        btn = page.locator(selector).first
+                        if await btn.is_visible(timeout=2000):
+                            next_btn = btn
+                            break
+                    except:
                         continue
 
-                print(f"      ✅ Extraídas: {len(cards)} | Total: {len(todas_licitaciones)} | En rango: {len(licitaciones_en_rango)}")
+                if not next_btn:
+                    print("   📋 No hay botón de siguiente página")
+                    break
 
-                # Paginación
-                if page_count >= max_paginas:
-                    print(f"   📋 Límite de páginas ({max_paginas}) alcanzado")
+                if await next_btn.is_disabled():
+                    print("   📋 Última página alcanzada")
                     break
 
+                # Capturar el primer código visible y esperar a que cambie
+                # tras el clic, en vez de networkidle + sleep fijo
                 try:
-                    next_btn = None
-                    next_selectors = [
-                        "button[aria-label='Siguiente página']",
-                        "button[aria-label*='Next']",
-                        "button:has-text('›')",
-                        "button:has-text('Siguiente')"
-                    ]
-                    for selector in next_selectors:
-                        try:
-                            btn = page.locator(selector).first
-                            if await btn.is_visible(timeout=2000):
-                                next_btn = btn
-                                break
-                        except:
-                            continue
-
-                    if not next_btn:
-                        print("   📋 No hay botón de siguiente página")
-                        break
-
-                    if await next_btn.is_disabled():
-                        print("   📋 Última página alcanzada")
-                        break
+                    first_code = (await page.locator("p.font-semibold").first.inner_text(timeout=2000)).strip()
+                except Exception:
+                    first_code = ""
 
-                    print("   ➡️  Siguiente página...")
-                    await next_btn.click()
+                print("   ➡️  Siguiente página...")
+                await next_btn.click()
+                try:
+                    await page.wait_for_function(
+                        "(prev) => { const el = document.querySelector('p.font-semibold'); "
+                        "return el && el.innerText.trim() !== prev; }",
+                        arg=first_code, timeout=15000
+                    )
+                except Exception:
                     await page.wait_for_load_state("networkidle", timeout=10000)
-                    await page.wait_for_timeout(2000)
-                    page_count += 1
+                page_count += 1
 
-                except Exception as e:
-                    print(f"   ℹ️  Fin de paginación: {str(e)[:80]}")
-                    break
-
-            await browser.close()
-
-            print(f"\n{'='*70}")
-            print(f"✅ EXTRACCIÓN COMPLETADA")
-            print(f"{'='*70}")
-            print(f"📊 Total extraídas: {len(todas_licitaciones)}")
-            print(f"✅ En rango de fechas ({fecha_inicio} → {fecha_fin}): {len(licitaciones_en_rango)}")
-            print(f"📄 Páginas procesadas: {page_count-1} / {max_paginas}")
-            print(f"{'='*70}\n")
+            except Exception as e:
+                print(f"   ℹ️  Fin de paginación: {str(e)[:80]}")
+                break
 
-            return licitaciones_en_rango
+        print(f"\n{'='*70}")
+        print(f"✅ EXTRACCIÓN COMPLETADA")
+        print(f"{'='*70}")
+        print(f"📊 Total extraídas: {total_extraidas}")
+        print(f"✅ En rango de fechas ({fecha_inicio} → {fecha_fin}): {total_en_rango}")
+        print(f"📄 Páginas procesadas: {page_count-1} / {max_paginas}")
+        print(f"{'='*70}\n")
 
     except Exception as e:
         print(f"\n❌ Error fatal: {e}")
         import traceback
         traceback.print_exc()
-        return []
+
+    finally:
+        await page.close()
 
 
 # ==============================
 # EXTRACCIÓN DE CUBSO
 # ==============================
 
+# Tipos de recurso y extensiones que no aportan nada a la extracción de CUBSO
+RECURSOS_BLOQUEADOS = {"image", "stylesheet", "font", "media", "websocket"}
+EXTENSIONES_BLOQUEADAS = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico",
+                          ".woff", ".woff2", ".ttf", ".css")
+TRACKERS_BLOQUEADOS = ("google-analytics.com", "googletagmanager.com",
+                       "facebook.net", "hotjar.com", "doubleclick.net")
+
+
 async def bloquear_recursos_innecesarios(route):
-    """Bloquea la carga de imágenes, css y fuentes"""
-    if route.request.resource_type in {"image", "stylesheet", "font"}:
-        await route.abort()
-    else:
-        await route.continue_()
+    """Bloquea imágenes, css, fuentes, media y trackers"""
+    url = route.request.url
+    if url.endswith(EXTENSIONES_BLOQUEADAS):
+        return await route.abort()
+    if route.request.resource_type in RECURSOS_BLOQUEADOS:
+        return await route.abort()
+    if any(tracker in url for tracker in TRACKERS_BLOQUEADOS):
+        return await route.abort()
+    await route.continue_()
 
 
 async def extraer_cubso_individual(context, url: str) -> str:
-    page = None
+    page = await context.new_page()
     try:
-        page = await context.new_page()
-        await page.route("**/*", bloquear_recursos_innecesarios)
         await page.goto(url, wait_until="domcontentloaded", timeout=30000)
 
         cubso = None
@@ -365,19 +439,22 @@ async def extraer_cubso_individual(context, url: str) -> str:
             pass
 
         if not cubso:
-            content = await page.content()
-            soup = BeautifulSoup(content, 'html.parser')
-            for td in soup.find_all('td'):
-                txt = td.get_text(strip=True)
-                if txt and txt.isdigit() and len(txt) >= 10:
-                    parent_row = td.find_parent('tr')
-                    if parent_row:
-                        table = td.find_parent('table')
-                        if table:
-                            headers = [th.get_text(strip=True).lower() for th in table.find_all('th')]
-                            if any('cubso' in h for h in headers):
-                                cubso = txt
-                                break
+            # Buscar en el navegador mismo: evita serializar y reparsear
+            # todo el HTML en Python solo para recorrer <td>
+            cubso = await page.evaluate("""() => {
+                const tds = document.querySelectorAll('td');
+                for (const td of tds) {
+                    const t = td.innerText.trim();
+                    if (/^\\d{10,}$/.test(t)) {
+                        const tbl = td.closest('table');
+                        if (tbl && [...tbl.querySelectorAll('th')].some(
+                                h => h.innerText.toLowerCase().includes('cubso'))) {
+                            return t;
+                        }
+                    }
+                }
+                return null;
+            }""")
 
         if not cubso:
             content = await page.content()
@@ -385,58 +462,61 @@ async def extraer_cubso_individual(context, url: str) -> str:
             if match:
                 cubso = match.group(1)
 
-        await page.close()
         return cubso.strip() if cubso else "No disponible"
 
     except Exception:
-        if page:
-            await page.close()
         return "Error"
 
+    finally:
+        await page.close()
+
 
-async def extraer_cubso_batch(enlaces: List[str], max_concurrent: int = 5) -> Dict[str, str]:
+async def extraer_cubso_batch(
+    context: BrowserContext,
+    enlaces: List[str],
+    max_concurrent: int = 5
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Generador asíncrono: produce (url, cubso) apenas termina cada página,
+    para que el llamador procese resultados mientras el resto sigue en vuelo.
+    """
     print(f"\n🔍 Extrayendo códigos CUBSO de {len(enlaces)} licitaciones...")
-    resultados = {}
 
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                headless=True,
-                args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
-            )
-            context = await browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
-
-            for i in range(0, len(enlaces), max_concurrent):
-                lote = enlaces[i:i + max_concurrent]
-                print(f"   📦 Procesando lote {i//max_concurrent + 1}/{(len(enlaces)//max_concurrent) + 1} ({len(lote)} licitaciones)...")
+        # Registrar el bloqueo una sola vez a nivel de contexto
+        # (aplica a todas las páginas sin costo de instalación por página)
+        await context.route("**/*", bloquear_recursos_innecesarios)
 
-                tasks = []
-                for url in lote:
-                    if url:
-                        tasks.append(extraer_cubso_individual(context, url))
+        # Semáforo en lugar de lotes: apenas termina una página entra la siguiente,
+        # sin esperar a la más lenta de cada lote
+        sem = asyncio.Semaphore(max_concurrent)
 
-                resultados_lote = await asyncio.gather(*tasks, return_exceptions=True)
+        async def _worker(url: str) -> Tuple[str, str]:
+            async with sem:
+                try:
+                    return url, await extraer_cubso_individual(context, url)
+                except Exception:
+                    return url, "Error"
 
-                for url, resultado in zip(lote, resultados_lote):
-                    if isinstance(resultado, Exception):
-                        resultados[url] = "Error"
-                    else:
-                        resultados[url] = resultado
+        tasks = [asyncio.ensure_future(_worker(url)) for url in enlaces if url]
 
-                cubsos_ok_lote = sum(1 for v in resultados_lote if v not in [None, "Error", "No disponible", ""])
-                print(f"      ✅ CUBSO extraídos (en este lote): {cubsos_ok_lote}/{len(lote)}")
-                await asyncio.sleep(0.5)
+        cubsos_ok = 0
+        for futuro in asyncio.as_completed(tasks):
+            url, cubso = await futuro
+            if cubso not in (None, "Error", "No disponible", ""):
+                cubsos_ok += 1
+            yield url, cubso
 
-            await browser.close()
-            print("   ✅ Extracción de CUBSO completada\n")
-            return resultados
+        print(f"      ✅ CUBSO extraídos: {cubsos_ok}/{len(tasks)}")
+        print("   ✅ Extracción de CUBSO completada\n")
 
     except Exception as e:
         print(f"   ❌ Error en extracción de CUBSO: {e}")
-        return resultados
+
+    finally:
+        # El contexto es persistente y compartido: retirar el bloqueo de
+        # recursos en vez de cerrarlo
+        await context.unroute("**/*")
 
 
 # ==============================
@@ -444,28 +524,34 @@ async def extraer_cubso_batch(enlaces: List[str], max_concurrent: int = 5) -> Di
 # ==============================
 
 def aplicar_filtros_licitaciones_seace(df: pd.DataFrame, keyword: str, objeto_tipo: List[str]) -> pd.DataFrame:
-    df_f = df.copy()
+    df_f = df
     if keyword.strip():
         k = keyword.strip().lower()
-        df_f = df_f[
-            df_f['Codigo Proceso'].str.lower().str.contains(k, na=False, regex=False) |
-            df_f['Entidad'].str.lower().str.contains(k, na=False, regex=False) |
-            df_f['Descripcion'].str.lower().str.contains(k, na=False, regex=False)
-        ]
+        # Una sola columna concatenada en minúsculas → un solo scan por fila
+        # en vez de tres pasadas lower+contains columna por columna
+        search_col = (df_f['Codigo Proceso'].fillna("") + "|" +
+                      df_f['Entidad'].fillna("") + "|" +
+                      df_f['Descripcion'].fillna("")).str.lower()
+        df_f = df_f[search_col.str.contains(k, na=False, regex=False)]
     if objeto_tipo:
         patron = '|'.join([t.lower() for t in objeto_tipo])
         df_f = df_f[df_f['Descripcion'].str.lower().str.contains(patron, na=False, regex=True)]
     return df_f
 
 
+# Patrones de sector pre-compilados: un solo re.search por categoría
+# en vez de ~20 búsquedas de substring por descripción
+_SECTOR_PATTERNS = [
+    ("INFRAESTRUCTURA/OBRA", re.compile(r"obra|construcc|vial|edificación|infraestructura")),
+    ("SERVICIOS/CONSULTORÍA", re.compile(r"servicio|consultor|asesor|mantenimiento")),
+    ("BIENES", re.compile(r"bien|adquisic|equipo|material|suministro")),
+    ("TECNOLOGÍA", re.compile(r"software|sistema|\bti\b|tecnología|informática")),
+]
+
+
 def determinar_sector(desc: str) -> str:
     d = desc.lower()
-    if any(w in d for w in ['obra', 'construcc', 'vial', 'edificación', 'infraestructura']):
-        return 'INFRAESTRUCTURA/OBRA'
-    if any(w in d for w in ['servicio', 'consultor', 'asesor', 'mantenimiento']):
-        return 'SERVICIOS/CONSULTORÍA'
-    if any(w in d for w in ['bien', 'adquisic', 'equipo', 'material', 'suministro']):
-        return 'BIENES'
-    if any(w in d for w in ['software', 'sistema', 'ti', 'tecnología', 'informática']):
-        return 'TECNOLOGÍA'
-    return "OTROS"
\ No newline at end of file
+    for label, pat in _SECTOR_PATTERNS:
+        if pat.search(d):
+            return label
+    return "OTROS"